@@ -0,0 +1,29 @@
+import numpy as np
+from simulation import ERSim
+
+# Staffing of the __main__ configuration in simulation.py; experiment
+# modules add their own sim_time
+BASE_CONFIG = {
+    "num_doctors": 100,
+    "num_nurses": 100,
+    "num_admin_staff": 70,
+    "num_consultants": 10,
+    "num_beds": 10,
+}
+DEFAULT_SEED = 258
+
+
+def run_ersim(config, seed, service_times=None, **options):
+    """
+    Run a quiet ERSim for config (BASE_CONFIG keys and sim_time) and
+    return it. service_times replaces activities of the default table,
+    e.g. a table read with service_times.load_service_times.
+    """
+    sim = ERSim(seed=seed, verbose=False, service_times=service_times, **config, **options)
+    sim.run_simulation()
+    return sim
+
+
+def mean_length_of_stay(sim):
+    los = [patient.leave_time - patient.arrival_time for patient in sim.patients if patient.leave_time > 0]
+    return float(np.mean(los)) if los else float("nan")
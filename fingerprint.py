@@ -0,0 +1,309 @@
+import argparse
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import numpy as np
+import simpy
+from experiment import BASE_CONFIG, DEFAULT_SEED
+from patients import Patient
+from simulation import ERSim
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fingerprints", "golden.json")
+
+# Rolling trace digest is stored every CHECKPOINT_INTERVAL events so a
+# mismatch can be narrowed down to a window of the trace; the golden
+# event trace is then read for that window to find the exact event
+CHECKPOINT_INTERVAL = 1000
+
+# Two days of the __main__ configuration in simulation.py
+DEFAULT_CONFIG = dict(BASE_CONFIG, sim_time=2880)
+
+
+class TraceRecorder:
+    """
+    TraceRecorder hooks into the simpy environment of an ERSim object and
+    computes a rolling hash of the ordered event trace. Each event is
+    described by its time, priority, type and the process or resource it
+    belongs to; object ids are left out so traces compare across builds.
+    """
+
+    def __init__(self, sim, checkpoint_interval=CHECKPOINT_INTERVAL, capture=None, trace_file=None):
+        self.env = sim.env
+        self.resource_names = {id(value): name for name, value in vars(sim).items()
+                               if isinstance(value, simpy.resources.base.BaseResource)}
+        self.hasher = hashlib.blake2b(digest_size=16)
+        self.events = 0
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoints = []
+
+        # Optional (start, stop) window of event records kept in memory
+        self.capture = capture
+        self.captured = []
+        self.trace_file = trace_file
+
+        self._step = self.env.step
+        self.env.step = self.step
+
+    def describe(self, event):
+        kind = type(event).__name__
+        if isinstance(event, simpy.events.Process):
+            return f"{kind}:{event._generator.__name__}"
+        if isinstance(event, simpy.events.Initialize):
+            return f"{kind}:{event.callbacks[0].__self__._generator.__name__}"
+        if isinstance(event, simpy.events.Timeout):
+            return f"{kind}:{float(event._delay).hex()}"
+        resource = getattr(event, "resource", None)
+        if resource is not None:
+            return f"{kind}:{self.resource_names.get(id(resource), type(resource).__name__)}"
+        return kind
+
+    def step(self):
+        if self.env._queue:
+            time, priority, _, event = self.env._queue[0]
+            record = f"{float(time).hex()}|{priority}|{self.describe(event)}"
+            self.hasher.update(record.encode() + b"\n")
+
+            if self.capture is not None and self.capture[0] <= self.events < self.capture[1]:
+                self.captured.append((self.events, record))
+            if self.trace_file is not None:
+                self.trace_file.write(record + "\n")
+
+            self.events += 1
+            if self.events % self.checkpoint_interval == 0:
+                self.checkpoints.append(self.hasher.hexdigest()[:16])
+
+        self._step()
+
+    def digest(self):
+        return self.hasher.hexdigest()
+
+
+def results_digest(sim):
+    hasher = hashlib.blake2b(digest_size=16)
+    for patient in sim.patients:
+        record = (f"{patient.id}|{patient.ctas_level}|{','.join(patient.tests)}|"
+                  f"{float(patient.arrival_time).hex()}|{float(patient.leave_time).hex()}|"
+                  f"{float(patient.triage_waiting_time).hex()}|{float(patient.ed_waiting_time).hex()}|"
+                  f"{float(patient.medication_waiting_time).hex()}|"
+                  f"{float(patient.inpatient_waiting_time).hex()}")
+        hasher.update(record.encode() + b"\n")
+    return hasher.hexdigest()
+
+
+def run_fingerprint(config=None, seed=DEFAULT_SEED, checkpoint_interval=CHECKPOINT_INTERVAL,
+                    capture=None, trace_path=None):
+    config = dict(DEFAULT_CONFIG if config is None else config)
+
+    # Patient ids come from class-level counters; reset them so the
+    # trace does not depend on earlier runs in the same process
+    Patient.patient_count = 0
+    ERSim.patient_count = 0
+    random.seed(seed)
+    np.random.seed(seed)
+
+    sim = ERSim(seed=seed, verbose=False, **config)
+    trace_file = open_trace(trace_path, "w") if trace_path else None
+    try:
+        recorder = TraceRecorder(sim, checkpoint_interval, capture, trace_file)
+        sim.run_simulation()
+    finally:
+        if trace_file is not None:
+            trace_file.close()
+
+    fingerprint = {
+        "config": config,
+        "seed": seed,
+        "events": recorder.events,
+        "trace": recorder.digest(),
+        "results": results_digest(sim),
+        "checkpoint_interval": checkpoint_interval,
+        "checkpoints": recorder.checkpoints,
+    }
+    return fingerprint, recorder.captured
+
+
+def first_divergence(expected, actual):
+    """
+    Compare two fingerprints and return None if they match, otherwise
+    the (start, stop) event window holding the first divergent event.
+    A window of one event is exact.
+    """
+    if expected["trace"] == actual["trace"] and expected["events"] == actual["events"]:
+        return None
+
+    interval = expected["checkpoint_interval"]
+    if actual["checkpoint_interval"] != interval:
+        raise ValueError("Fingerprints were recorded with different checkpoint intervals")
+
+    index = 0
+    for index, (a, b) in enumerate(zip(expected["checkpoints"], actual["checkpoints"])):
+        if a != b:
+            break
+    else:
+        index = min(len(expected["checkpoints"]), len(actual["checkpoints"]))
+
+    start = index * interval
+    stop = min(start + interval, max(expected["events"], actual["events"]))
+    return start, stop
+
+
+def open_trace(path, mode="r"):
+    """Open a trace file for text reading or writing, gzip compressed if it ends in .gz."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    return open(path, mode)
+
+
+def read_trace(trace_file, start=0, stop=None):
+    return (line.rstrip("\n") for line in itertools.islice(trace_file, start, stop))
+
+
+def first_record_divergence(records_a, records_b, start=0):
+    """
+    Return (event index, record a, record b) of the first difference of
+    two event record sequences starting at event start, or None if they
+    are equal. The record of a sequence that ended first is None.
+    """
+    for index, (record_a, record_b) in enumerate(itertools.zip_longest(records_a, records_b), start):
+        if record_a != record_b:
+            return index, record_a, record_b
+    return None
+
+
+def first_trace_divergence(path_a, path_b):
+    """
+    Compare two full trace files written with --trace-out by two builds
+    (or a golden trace) and return (event index, record a, record b) of
+    the first difference.
+    """
+    with open_trace(path_a) as file_a, open_trace(path_b) as file_b:
+        return first_record_divergence(read_trace(file_a), read_trace(file_b))
+
+
+def fingerprint_key(config, seed):
+    return json.dumps({"config": config, "seed": seed}, sort_keys=True)
+
+
+def golden_trace_path(key, path=GOLDEN_PATH):
+    """Golden event trace of the fingerprint with this key, stored next to the golden file."""
+    name = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    return os.path.join(os.path.dirname(os.path.abspath(path)), f"trace-{name}.txt.gz")
+
+
+def load_golden(path=GOLDEN_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_golden(golden, path=GOLDEN_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(golden, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def record(config, seed, checkpoint_interval, path, trace_path=None):
+    config = dict(DEFAULT_CONFIG if config is None else config)
+    key = fingerprint_key(config, seed)
+    golden_trace = golden_trace_path(key, path)
+    os.makedirs(os.path.dirname(golden_trace), exist_ok=True)
+
+    fingerprint, _ = run_fingerprint(config, seed, checkpoint_interval, trace_path=golden_trace)
+    fingerprint["trace_file"] = os.path.basename(golden_trace)
+    golden = load_golden(path)
+    golden[key] = fingerprint
+    save_golden(golden, path)
+
+    if trace_path:
+        with open_trace(golden_trace) as source, open(trace_path, "w") as target:
+            shutil.copyfileobj(source, target)
+
+    print(f"Recorded {fingerprint['events']} events, trace {fingerprint['trace']}, "
+          f"results {fingerprint['results']}")
+    return fingerprint
+
+
+def verify(config, seed, path, trace_path=None):
+    config = dict(DEFAULT_CONFIG if config is None else config)
+    golden = load_golden(path).get(fingerprint_key(config, seed))
+    if golden is None:
+        raise KeyError(f"No golden fingerprint for seed {seed} and config {config} in {path}")
+
+    fingerprint, _ = run_fingerprint(config, seed, golden["checkpoint_interval"], trace_path=trace_path)
+    window = first_divergence(golden, fingerprint)
+
+    if window is None and golden["results"] == fingerprint["results"]:
+        print(f"Fingerprint matches: {fingerprint['events']} events, trace {fingerprint['trace']}")
+        return True
+
+    if window is None:
+        print("Event trace matches but per-patient results differ")
+        return False
+
+    start, stop = window
+    print(f"Event trace diverges from golden ({golden['events']} events expected, "
+          f"{fingerprint['events']} found)")
+
+    # Replay the same run keeping only the divergent window
+    _, captured = run_fingerprint(config, seed, golden["checkpoint_interval"], capture=window)
+    current = [event_record for _, event_record in captured]
+
+    golden_trace = os.path.join(os.path.dirname(os.path.abspath(path)), golden.get("trace_file", ""))
+    if not os.path.isfile(golden_trace):
+        print(f"No golden trace saved; first divergent event is in events [{start}, {stop})")
+        for index, event_record in captured:
+            print(f"{index}: {event_record}")
+        return False
+
+    with open_trace(golden_trace) as trace_file:
+        divergence = first_record_divergence(read_trace(trace_file, start, stop), current, start)
+    index, golden_record, current_record = divergence
+    print(f"First divergent event {index}:\n  golden:  {golden_record}\n  current: {current_record}")
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic trace fingerprints of ERSim runs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    for command in ("record", "verify"):
+        subparser = subparsers.add_parser(command)
+        subparser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+        subparser.add_argument("--sim-time", type=int, default=DEFAULT_CONFIG["sim_time"])
+        subparser.add_argument("--golden", default=GOLDEN_PATH)
+        subparser.add_argument("--trace-out", default=None,
+                               help="Write the full event trace to this file")
+    subparsers.choices["record"].add_argument("--checkpoint-interval", type=int,
+                                              default=CHECKPOINT_INTERVAL)
+
+    diff_parser = subparsers.add_parser("diff", help="First divergent event of two --trace-out files")
+    diff_parser.add_argument("trace_a")
+    diff_parser.add_argument("trace_b")
+
+    args = parser.parse_args()
+
+    if args.command == "diff":
+        divergence = first_trace_divergence(args.trace_a, args.trace_b)
+        if divergence is None:
+            print("Traces are identical")
+        else:
+            index, record_a, record_b = divergence
+            print(f"First divergent event {index}:\n  a: {record_a}\n  b: {record_b}")
+            raise SystemExit(1)
+        return
+
+    config = dict(DEFAULT_CONFIG, sim_time=args.sim_time)
+    if args.command == "record":
+        record(config, args.seed, args.checkpoint_interval, args.golden, args.trace_out)
+    elif not verify(config, args.seed, args.golden, args.trace_out):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
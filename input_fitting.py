@@ -0,0 +1,154 @@
+import argparse
+import hashlib
+import json
+import os
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from input_models import FORMAT_VERSION, INPUT_MODELS_PATH, InputModels, read_input_models_file
+
+# Table 1 of the CIHI NACRS provisional ED visits workbook
+LOS_SHEET = "1 ED visits, LOS"
+CTAS_GROUPS = ("CTAS I-III", "CTAS IV-V", "Admitted")
+
+# Column layout of LOS_SHEET: province, total volume, then volume, 50th
+# and 90th percentile LOS (hours) for each of CTAS_GROUPS
+VOLUME_COLUMNS = (2, 3, 4)
+P50_COLUMNS = (5, 6, 7)
+P90_COLUMNS = (8, 9, 10)
+
+# April to September, as in the arrival-rate notebooks
+DEFAULT_PERIOD_DAYS = 6 * 30
+
+
+def file_digest(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def read_los_table(path, sheet_name=LOS_SHEET):
+    """
+    Read the ED visits and LOS table of a NACRS workbook into a DataFrame
+    indexed by province with one row per province/territory. Footnote
+    markers are stripped from the province names.
+    """
+    df = pd.read_excel(path, sheet_name=sheet_name, header=None)
+
+    # Data rows are the ones with a numeric total ED volume
+    total = pd.to_numeric(df[1], errors="coerce")
+    df = df[total.notna()]
+
+    columns = {0: "province"}
+    for index, group in enumerate(CTAS_GROUPS):
+        columns[VOLUME_COLUMNS[index]] = f"volume {group}"
+        columns[P50_COLUMNS[index]] = f"p50 {group}"
+        columns[P90_COLUMNS[index]] = f"p90 {group}"
+
+    table = df[list(columns)].rename(columns=columns)
+    table["province"] = table["province"].astype(str).str.replace("*", "", regex=False).str.strip()
+    return table.set_index("province").apply(pd.to_numeric, errors="coerce")
+
+
+def fit_lognormal(p50, p90):
+    """
+    Lognormal LOS matching the 50th and 90th percentiles: the median
+    gives the scale and the ratio of the percentiles the shape. Returns
+    scipy.stats.lognorm (s, scale) parameters, in hours.
+    """
+    s = np.log(p90 / p50) / NormalDist().inv_cdf(0.9)
+    return {"s": float(s), "scale": float(p50)}
+
+
+def fit_input_models(table, period_days=DEFAULT_PERIOD_DAYS):
+    """
+    Poisson arrival rate (patients per minute) and lognormal LOS for each
+    province and CTAS group of a table from read_los_table.
+    """
+    period_minutes = period_days * 24 * 60
+    provinces = {}
+    for province, row in table.iterrows():
+        groups = {}
+        for group in CTAS_GROUPS:
+            volume = row[f"volume {group}"]
+            if pd.isna(volume):
+                continue
+            model = {"arrival_rate": float(volume) / period_minutes}
+
+            p50, p90 = row[f"p50 {group}"], row[f"p90 {group}"]
+            if pd.notna(p50) and pd.notna(p90) and p90 > p50 > 0:
+                model["los"] = fit_lognormal(p50, p90)
+            groups[group] = model
+        provinces[province] = groups
+    return provinces
+
+
+def parse_workbook(spec, period_days=DEFAULT_PERIOD_DAYS):
+    """
+    Split a PATH[:DAYS] workbook argument into the path and the number
+    of days its ED volumes cover, period_days when DAYS is not given.
+    """
+    path, separator, days = spec.rpartition(":")
+    if separator and days.isdigit():
+        return path, int(days)
+    return spec, period_days
+
+
+def build_input_models(workbooks, path=INPUT_MODELS_PATH, period_days=DEFAULT_PERIOD_DAYS, replace=False):
+    """
+    Fit every workbook and write the parameters to path. A workbook is a
+    path, or a (path, period_days) pair when its period differs from
+    period_days. Workbooks whose contents and period are unchanged since
+    the last build are taken from the existing file instead of being read
+    and fitted again. Sources fitted earlier from other workbooks are
+    kept unless replace is set.
+    """
+    # A missing, unreadable or old-version file is an empty cache
+    cached_sources = read_input_models_file(path) or {}
+
+    sources = {} if replace else dict(cached_sources)
+    for workbook in workbooks:
+        workbook, workbook_days = workbook if isinstance(workbook, tuple) else (workbook, period_days)
+        name = os.path.basename(workbook)
+        digest = file_digest(workbook)
+
+        source = cached_sources.get(name)
+        if source is None or source["sha256"] != digest or source["period_days"] != workbook_days:
+            print(f"Fitting {name}")
+            source = {
+                "sha256": digest,
+                "period_days": workbook_days,
+                "provinces": fit_input_models(read_los_table(workbook), workbook_days),
+            }
+        else:
+            print(f"Using cached fit of {name}")
+        sources[name] = source
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"version": FORMAT_VERSION, "sources": sources}, f, separators=(",", ":"), sort_keys=True)
+    return InputModels(sources)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit arrival and LOS input models from NACRS workbooks")
+    parser.add_argument("workbooks", nargs="+", metavar="PATH[:DAYS]",
+                        help="NACRS workbook, with the days its ED volumes cover when not --period-days")
+    parser.add_argument("--output", default=INPUT_MODELS_PATH)
+    parser.add_argument("--period-days", type=int, default=DEFAULT_PERIOD_DAYS,
+                        help="Days covered by the ED volumes of workbooks without :DAYS")
+    parser.add_argument("--replace", action="store_true",
+                        help="Drop sources fitted earlier from workbooks not given here")
+    args = parser.parse_args()
+
+    workbooks = [parse_workbook(spec, args.period_days) for spec in args.workbooks]
+    models = build_input_models(workbooks, args.output, args.period_days, args.replace)
+    for name, source in models.sources.items():
+        for province in source["provinces"]:
+            print(f"{name} {province}: arrival rate {models.arrival_rate(province, name):.4f} per minute")
+
+
+if __name__ == "__main__":
+    main()
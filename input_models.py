@@ -0,0 +1,67 @@
+import json
+import os
+
+INPUT_MODELS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "params", "input_models.json")
+
+# Bump when the fitting or the file layout changes; input_fitting.py
+# refits cached files with another version
+FORMAT_VERSION = 1
+
+
+def read_input_models_file(path=INPUT_MODELS_PATH):
+    """
+    Fitted sources of an input models file, or None when the file is
+    missing, unreadable or has another FORMAT_VERSION.
+    """
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("version") != FORMAT_VERSION:
+        return None
+    return data.get("sources")
+
+
+def load_input_models(path=INPUT_MODELS_PATH):
+    sources = read_input_models_file(path)
+    if sources is None:
+        raise ValueError(f"{path} is missing, unreadable or not input model version {FORMAT_VERSION}; "
+                         f"rebuild it with input_fitting.py")
+    return InputModels(sources)
+
+
+class InputModels:
+    """
+    InputModels gives the fitted arrival and LOS parameters by source
+    workbook, province and CTAS group.
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+
+    def get_source(self, source=None):
+        if source is None:
+            if len(self.sources) != 1:
+                raise ValueError(f"Choose a source workbook, one of {sorted(self.sources)}")
+            source = next(iter(self.sources))
+        if source not in self.sources:
+            raise KeyError(f"No fitted source {source}, one of {sorted(self.sources)}")
+        return self.sources[source]
+
+    def get_province(self, province, source=None):
+        provinces = self.get_source(source)["provinces"]
+        if province not in provinces:
+            raise KeyError(f"No fitted input models for {province}, one of {sorted(provinces)}")
+        return provinces[province]
+
+    def arrival_rate(self, province, source=None, groups=("CTAS I-III", "CTAS IV-V")):
+        """
+        Arrival rate in patients per minute. Admitted visits are also
+        counted in the CTAS groups, so they are left out by default.
+        """
+        models = self.get_province(province, source)
+        return sum(models[group]["arrival_rate"] for group in groups)
+
+    def los(self, province, group, source=None):
+        return self.get_province(province, source)[group].get("los")
@@ -0,0 +1,345 @@
+import argparse
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+from experiment import BASE_CONFIG, DEFAULT_SEED
+from patients import Patient
+from simulation import ERSim
+
+# Patients are transferred at most this many times, so diversion and
+# referral cannot bounce a patient around the region
+MAX_TRANSFERS = 1
+
+
+class NetworkSite(ERSim):
+    """
+    NetworkSite: ERSim emergency department that is one site of a
+    regional network. Arriving patients are diverted to another site when
+    the waiting rooms are over divert_threshold, and local health center
+    referrals (CTAS 6) are sent to the health center of referral_site
+    when one is set. Patients leaving are put in the outbox; the network
+    delivers them after the transfer delay.
+    """
+
+    def __init__(self, name, index, transfer_delays, divert_threshold=None, referral_site=None, **config):
+        super().__init__(**config)
+        self.name = name
+        self.index = index
+        self.transfer_delays = transfer_delays
+        self.divert_threshold = divert_threshold
+        self.referral_site = referral_site
+
+        # Waiting room load of every site at the start of the current window
+        self.site_loads = None
+
+        self.outbox = []
+        self.diverted_out = 0
+        self.referred_out = 0
+        self.diverted_in = 0
+        self.referred_in = 0
+
+    def get_load(self):
+        # Patients waiting in the waiting rooms or for a doctor
+        return len(self.triage_waiting_room) + len(self.ed_waiting_room) + len(self.doctor.queue)
+
+    def get_diversion_site(self):
+        if self.site_loads is None:
+            return None
+
+        # Least loaded other site, nearest first on ties
+        candidates = [(load, self.transfer_delays[site], site) for site, load in enumerate(self.site_loads)
+                      if site != self.index and (self.divert_threshold is None or load < self.divert_threshold)]
+        return min(candidates)[2] if candidates else None
+
+    def divert(self, patient):
+        if (self.divert_threshold is None or patient.transfers >= MAX_TRANSFERS
+                or self.get_load() < self.divert_threshold):
+            return False
+
+        destination = self.get_diversion_site()
+        if destination is None:
+            return False
+
+        self.diverted_out += 1
+        self.send(patient, destination, "diversion")
+        return True
+
+    def refer_out(self, patient):
+        if self.referral_site is None or patient.transfers >= MAX_TRANSFERS:
+            super().refer_out(patient)
+            return
+
+        self.referred_out += 1
+        self.send(patient, self.referral_site, "referral")
+
+    def send(self, patient, destination, reason):
+        patient.transferred_to = destination
+        self.outbox.append({
+            "origin": self.index,
+            "destination": destination,
+            "reason": reason,
+            "arrival": self.env.now + self.transfer_delays[destination],
+            "sequence": self.diverted_out + self.referred_out,
+            "patient": {
+                "arrival_time": patient.arrival_time,
+                "transfers": patient.transfers,
+            },
+        })
+
+    def receive(self, message):
+        record = message["patient"]
+        patient = Patient(record["arrival_time"], rng=self.get_patient_stream())
+        patient.transfers = record["transfers"] + 1
+        self.patients.append(patient)
+
+        if message["reason"] == "referral":
+            # Referred patients do not need an ED; the local health
+            # center of this site takes them on arrival
+            self.referred_in += 1
+            patient.ctas_level = 6
+            self.env.process(self.admit_referral(patient, message["arrival"]))
+        else:
+            # Diverted patients were sent on arrival, before any triage,
+            # so they start the patient flow from the beginning here
+            self.diverted_in += 1
+            self.env.process(self.admit_diversion(patient, message["arrival"]))
+
+    def admit_diversion(self, patient, arrival):
+        yield self.env.timeout(arrival - self.env.now)
+        self.log(f"Patient{patient.id} diverted in")
+        yield self.env.process(self.patient_flow(patient))
+
+    def admit_referral(self, patient, arrival):
+        yield self.env.timeout(arrival - self.env.now)
+        self.log(f"Patient{patient.id} referred in to the local health center")
+        patient.leave_time = self.env.now
+
+    def get_results(self):
+        treated = [patient for patient in self.patients if patient.transferred_to is None]
+        los = [patient.leave_time - patient.arrival_time for patient in treated if patient.leave_time > 0]
+        return {
+            "site": self.name,
+            "arrivals": len(self.patients) - self.diverted_in - self.referred_in,
+            "diverted_in": self.diverted_in,
+            "referred_in": self.referred_in,
+            "diverted_out": self.diverted_out,
+            "referred_out": self.referred_out,
+            "processed": self.patients_processed,
+            "mean_los": float(np.mean(los)) if los else float("nan"),
+        }
+
+
+class Partition:
+    """
+    Partition owns a group of sites and advances all of them through one
+    synchronization window at a time.
+    """
+
+    def __init__(self, site_specs):
+        self.sites = [NetworkSite(**spec) for spec in site_specs]
+        for site in self.sites:
+            site.start_simulation()
+
+    def advance(self, until, inbox, site_loads):
+        outbox = []
+        loads = {}
+        for site in self.sites:
+            site.site_loads = site_loads
+            for message in inbox.get(site.index, []):
+                site.receive(message)
+
+            site.env.run(until=until)
+            outbox.extend(site.outbox)
+            site.outbox = []
+            loads[site.index] = site.get_load()
+        return outbox, loads
+
+    def get_results(self):
+        return [site.get_results() for site in self.sites]
+
+
+def partition_worker(connection, site_specs):
+    partition = Partition(site_specs)
+    while True:
+        command, args = connection.recv()
+        if command == "advance":
+            connection.send(partition.advance(*args))
+        elif command == "results":
+            connection.send(partition.get_results())
+        else:
+            break
+    connection.close()
+
+
+class LocalPartition:
+    """Partition run in the coordinating process."""
+
+    def __init__(self, site_specs):
+        self.partition = Partition(site_specs)
+        self.reply = None
+
+    def submit(self, command, args=()):
+        if command == "advance":
+            self.reply = self.partition.advance(*args)
+        elif command == "results":
+            self.reply = self.partition.get_results()
+
+    def receive(self):
+        return self.reply
+
+    def close(self):
+        pass
+
+
+class ProcessPartition:
+    """Partition run in its own worker process."""
+
+    def __init__(self, site_specs):
+        self.connection, child_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=partition_worker, args=(child_connection, site_specs))
+        self.process.start()
+        child_connection.close()
+
+    def submit(self, command, args=()):
+        self.connection.send((command, args))
+
+    def receive(self):
+        return self.connection.recv()
+
+    def close(self):
+        self.connection.send(("stop", ()))
+        self.process.join()
+        self.connection.close()
+
+
+class RegionalNetwork:
+    """
+    RegionalNetwork simulates a region of EDs connected by transfer
+    delays (minutes, transfer_delays[origin][destination]). Sites are
+    split over worker processes and synchronized conservatively: every
+    window is as long as the shortest transfer delay, so a patient sent
+    during a window arrives at or after its end and no site has to wait
+    on another within a window. Results do not depend on the number of
+    processes.
+    """
+
+    def __init__(self, sites, transfer_delays, sim_time, processes=None):
+        self.transfer_delays = np.asarray(transfer_delays, dtype=float)
+        num_sites = len(sites)
+        if self.transfer_delays.shape != (num_sites, num_sites):
+            raise ValueError(f"transfer_delays must be {num_sites}x{num_sites} for {num_sites} sites")
+
+        off_diagonal = self.transfer_delays[~np.eye(num_sites, dtype=bool)]
+        self.lookahead = off_diagonal.min() if off_diagonal.size else sim_time
+        if self.lookahead <= 0:
+            raise ValueError("Transfer delays between sites must be positive")
+
+        self.sim_time = sim_time
+        self.names = [site["name"] for site in sites]
+        self.site_specs = []
+        for index, site in enumerate(sites):
+            spec = dict(site, index=index, sim_time=sim_time,
+                        transfer_delays=self.transfer_delays[index].tolist())
+            spec.setdefault("verbose", False)
+            if spec.get("referral_site") is not None:
+                spec["referral_site"] = self.names.index(spec["referral_site"])
+            self.site_specs.append(spec)
+
+        processes = os.cpu_count() if processes is None else processes
+        self.num_partitions = max(1, min(processes, num_sites))
+        self.in_transit = 0
+
+    def run(self):
+        groups = [self.site_specs[start::self.num_partitions] for start in range(self.num_partitions)]
+        partition_type = LocalPartition if self.num_partitions == 1 else ProcessPartition
+        partitions = [partition_type(group) for group in groups]
+
+        inbox = {}
+        site_loads = None
+        now = 0
+        try:
+            while now < self.sim_time:
+                until = min(now + self.lookahead, self.sim_time)
+                for partition in partitions:
+                    partition.submit("advance", (until, inbox, site_loads))
+
+                messages = []
+                loads = {}
+                for partition in partitions:
+                    outbox, partition_loads = partition.receive()
+                    messages.extend(outbox)
+                    loads.update(partition_loads)
+
+                inbox = self.route(messages)
+                site_loads = [loads[index] for index in range(len(self.site_specs))]
+                now = until
+
+            results = []
+            for partition in partitions:
+                partition.submit("results")
+            for partition in partitions:
+                results.extend(partition.receive())
+        finally:
+            for partition in partitions:
+                partition.close()
+
+        return pd.DataFrame(results).set_index("site").loc[self.names]
+
+    def route(self, messages):
+        inbox = {}
+        for message in sorted(messages, key=lambda m: (m["arrival"], m["origin"], m["sequence"])):
+            if message["arrival"] >= self.sim_time:
+                self.in_transit += 1
+                continue
+            inbox.setdefault(message["destination"], []).append(message)
+        return inbox
+
+
+def regional_network(num_sites, base_delay, delay_per_hop, divert_threshold, referrals, config, seed):
+    """
+    Sites on a line with transfer delays growing with distance. With
+    referrals, local health center referrals go to the health center of
+    the next site.
+    """
+    positions = np.arange(num_sites)
+    hops = np.abs(positions[:, None] - positions[None, :])
+    transfer_delays = np.where(hops > 0, base_delay + delay_per_hop * (hops - 1), 0)
+
+    sites = []
+    for index in range(num_sites):
+        sites.append(dict(config, name=f"ED{index + 1}", seed=seed + index, divert_threshold=divert_threshold,
+                          referral_site=f"ED{(index + 1) % num_sites + 1}" if referrals and num_sites > 1 else None))
+    return sites, transfer_delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regional network of ED simulations")
+    parser.add_argument("--sites", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--sim-time", type=int, default=1440)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--transfer-delay", type=float, default=30, help="Minutes between neighbouring sites")
+    parser.add_argument("--delay-per-hop", type=float, default=10)
+    parser.add_argument("--divert-threshold", type=int, default=None,
+                        help="Waiting room load at which arrivals are diverted")
+    parser.add_argument("--referrals", action="store_true", help="Refer CTAS 6 patients to the next site")
+    parser.add_argument("--refer-out-probability", type=float, default=0.0,
+                        help="Share of screened patients referred to a local health center (CTAS 6)")
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--nurses", type=int, default=20)
+    args = parser.parse_args()
+
+    config = dict(BASE_CONFIG, num_doctors=args.doctors, num_nurses=args.nurses,
+                  refer_out_probability=args.refer_out_probability)
+    sites, transfer_delays = regional_network(args.sites, args.transfer_delay, args.delay_per_hop,
+                                              args.divert_threshold, args.referrals, config, args.seed)
+    network = RegionalNetwork(sites, transfer_delays, args.sim_time, args.processes)
+    results = network.run()
+
+    print(results.to_string())
+    print(f"Patients in transit at the end: {network.in_transit}")
+
+
+if __name__ == "__main__":
+    main()
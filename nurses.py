@@ -3,7 +3,9 @@ import simpy
 class Nurse:
     '''
     Nurse class defines a nurse object with
-    ID, shift schedule, and skill level
+    ID, shift schedule, and skill level.
+    schedule_time is a list of (day, start_hour, end_hour) shifts,
+    see ShiftRoster.from_staff
     '''
 
     def __init__(self, schedule_time, skill_level):
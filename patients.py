@@ -9,8 +9,9 @@ class Patient:
 
     patient_count = 0
 
-    def __init__(self, arrival_time, leave_time=0, ctas_level=None, bed_assigned=None):
+    def __init__(self, arrival_time, leave_time=0, ctas_level=None, bed_assigned=None, rng=None):
         self.env = simpy.Environment()
+        self.rng = rng or random
 
         Patient.patient_count += 1
         self.id = Patient.patient_count
@@ -24,11 +25,15 @@ class Patient:
         self.tests = []
         self.bed_assigned = bed_assigned
 
+        # Transfers between EDs of a regional network
+        self.transfers = 0
+        self.transferred_to = None
+
     def get_ctas_level(self):
         if self.ctas_level >0:
             return self.ctas_level
         else:
-            return int(random.randint(1, 5))
+            return int(self.rng.randint(1, 5))
 
     def get_triage_treatment_review(self):
-        return random.randint(0, 1)
\ No newline at end of file
+        return self.rng.randint(0, 1)
\ No newline at end of file
@@ -0,0 +1,243 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from experiment import BASE_CONFIG, DEFAULT_SEED, mean_length_of_stay, run_ersim
+from service_times import SERVICE_TIMES, load_service_times
+from simulation import MODEL_VERSION
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results", "sensitivity_cache.json")
+
+# Each factor is varied by +/- RELATIVE_RANGE of its nominal value
+RELATIVE_RANGE = 0.25
+
+# One week of the __main__ configuration in simulation.py
+DEFAULT_CONFIG = dict(BASE_CONFIG, sim_time=10080)
+
+# Factors of each activity's triangular distribution: the mode and the
+# distances from it to low and to high
+PARAMETERS = ("mode", "left_spread", "right_spread")
+
+
+class ParameterSpace:
+    """
+    ParameterSpace maps points of the unit hypercube to service time
+    tables. Each activity has three factors, its mode and non-negative
+    left and right spreads, so every sampled point is a valid triangular
+    distribution and each factor keeps its meaning.
+    """
+
+    def __init__(self, service_times=None, relative_range=RELATIVE_RANGE):
+        service_times = SERVICE_TIMES if service_times is None else service_times
+        self.activities = list(service_times)
+        low, mode, high = np.array([service_times[activity] for activity in self.activities], dtype=float).T
+        self.nominal = np.stack([mode, mode - low, high - mode], axis=1)
+        self.lower = self.nominal * (1 - relative_range)
+        self.upper = self.nominal * (1 + relative_range)
+        self.names = [f"{activity}.{parameter}" for activity in self.activities for parameter in PARAMETERS]
+
+    @property
+    def num_factors(self):
+        return self.nominal.size
+
+    def scale(self, unit_sample):
+        """Map an (n, num_factors) sample in [0, 1] to (low, mode, high) of shape (n, activities, 3)."""
+        unit_sample = np.asarray(unit_sample).reshape(-1, len(self.activities), len(PARAMETERS))
+        mode, left, right = np.moveaxis(self.lower + unit_sample * (self.upper - self.lower), 2, 0)
+        return np.stack([np.maximum(mode - left, 0), mode, mode + right], axis=2)
+
+    def to_tables(self, unit_sample):
+        return [dict(zip(self.activities, map(tuple, row.tolist()))) for row in self.scale(unit_sample)]
+
+
+def morris_sample(num_factors, num_trajectories, num_levels=4, rng=None):
+    """
+    Morris one-at-a-time trajectories, generated for all trajectories at
+    once. Returns an array of shape (num_trajectories, num_factors + 1,
+    num_factors) in the unit hypercube.
+    """
+    rng = np.random.default_rng(rng)
+    delta = num_levels / (2 * (num_levels - 1))
+
+    # Base points on the grid {0, 1/(p-1), ..., 1 - delta}
+    start_levels = np.arange(num_levels // 2) / (num_levels - 1)
+    base = rng.choice(start_levels, size=(num_trajectories, 1, num_factors))
+
+    # Strictly lower triangular step matrix, random directions and order
+    steps = np.tri(num_factors + 1, num_factors, k=-1)
+    directions = rng.choice([-1.0, 1.0], size=(num_trajectories, 1, num_factors))
+    orders = rng.permuted(np.tile(np.arange(num_factors), (num_trajectories, 1)), axis=1)
+
+    trajectories = base + (delta / 2) * ((2 * steps - 1) * directions + 1)
+    return np.take_along_axis(trajectories, orders[:, None, :], axis=2)
+
+
+def morris_indices(trajectories, outputs):
+    """
+    Elementary effects statistics mu, mu_star and sigma per factor from
+    the trajectories and the model output at each of their points.
+    """
+    num_trajectories, num_points, num_factors = trajectories.shape
+    outputs = np.asarray(outputs).reshape(num_trajectories, num_points)
+
+    step = np.diff(trajectories, axis=1)
+    factor = np.abs(step).argmax(axis=2)
+    delta = np.take_along_axis(step, factor[..., None], axis=2)[..., 0]
+    effects = np.diff(outputs, axis=1) / delta
+
+    by_factor = np.empty((num_trajectories, num_factors))
+    np.put_along_axis(by_factor, factor, effects, axis=1)
+    return {
+        "mu": by_factor.mean(axis=0),
+        "mu_star": np.abs(by_factor).mean(axis=0),
+        "sigma": by_factor.std(axis=0, ddof=1) if num_trajectories > 1 else np.zeros(num_factors),
+    }
+
+
+def sobol_sample(num_factors, num_samples, rng=None):
+    """
+    Saltelli design: matrices A and B and, for every factor i, A with
+    column i taken from B. Returns an array of shape
+    (num_factors + 2, num_samples, num_factors) ordered A, B, AB_1, ...
+    """
+    rng = np.random.default_rng(rng)
+    a, b = rng.random((2, num_samples, num_factors))
+
+    ab = np.repeat(a[None], num_factors, axis=0)
+    columns = np.arange(num_factors)
+    ab[columns, :, columns] = b[:, columns].T
+    return np.concatenate([a[None], b[None], ab])
+
+
+def sobol_indices(outputs, num_factors):
+    """
+    First order (Saltelli 2010) and total (Jansen) Sobol indices from
+    the outputs of the sobol_sample design.
+    """
+    outputs = np.asarray(outputs).reshape(num_factors + 2, -1)
+    f_a, f_b, f_ab = outputs[0], outputs[1], outputs[2:]
+    variance = np.var(np.concatenate([f_a, f_b]))
+
+    return {
+        "S1": np.mean(f_b * (f_ab - f_a), axis=1) / variance,
+        "ST": 0.5 * np.mean((f_a - f_ab) ** 2, axis=1) / variance,
+    }
+
+
+def run_model(args):
+    config, seed, service_times = args
+    return mean_length_of_stay(run_ersim(config, seed, service_times=service_times))
+
+
+class ResultCache:
+    """
+    ResultCache stores model outputs keyed by a hash of the config,
+    seed and service time table, so repeated and extended studies only
+    run the points that have not been evaluated yet. MODEL_VERSION is
+    part of the key, so results of an older model are not reused.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.results = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                self.results = json.load(f)
+
+    @staticmethod
+    def key(config, seed, service_times):
+        table = sorted((activity, [float(x) for x in params]) for activity, params in service_times.items())
+        payload = json.dumps([MODEL_VERSION, config, seed, table], sort_keys=True)
+        return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+    def save(self):
+        if self.path is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.results, f)
+
+
+def evaluate(tables, config=None, seed=DEFAULT_SEED, processes=None, cache=None):
+    """
+    Mean LOS for every service time table. Tables found in the cache are
+    not run again; the rest run in parallel over a process pool. All runs
+    share the same seed (common random numbers).
+    """
+    config = dict(DEFAULT_CONFIG if config is None else config)
+    cache = ResultCache(None) if cache is None else cache
+
+    keys = [cache.key(config, seed, table) for table in tables]
+    pending = {}
+    for key, table in zip(keys, tables):
+        if key not in cache.results:
+            pending.setdefault(key, table)
+
+    if pending:
+        jobs = [(config, seed, table) for table in pending.values()]
+        if processes == 1:
+            outputs = list(map(run_model, jobs))
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                outputs = list(executor.map(run_model, jobs, chunksize=max(1, len(jobs) // 64)))
+        cache.results.update(zip(pending, outputs))
+        cache.save()
+
+    print(f"Evaluated {len(pending)} runs, {len(tables) - len(pending)} from cache")
+    return np.array([cache.results[key] for key in keys])
+
+
+def run_morris(num_trajectories, num_levels=4, config=None, seed=DEFAULT_SEED, processes=None,
+               cache=None, space=None):
+    space = ParameterSpace() if space is None else space
+    trajectories = morris_sample(space.num_factors, num_trajectories, num_levels, rng=seed)
+    outputs = evaluate(space.to_tables(trajectories.reshape(-1, space.num_factors)),
+                       config, seed, processes, cache)
+
+    indices = morris_indices(trajectories, outputs)
+    return pd.DataFrame(indices, index=space.names).sort_values("mu_star", ascending=False)
+
+
+def run_sobol(num_samples, config=None, seed=DEFAULT_SEED, processes=None, cache=None, space=None):
+    space = ParameterSpace() if space is None else space
+    design = sobol_sample(space.num_factors, num_samples, rng=seed)
+    outputs = evaluate(space.to_tables(design.reshape(-1, space.num_factors)),
+                       config, seed, processes, cache)
+
+    indices = sobol_indices(outputs, space.num_factors)
+    return pd.DataFrame(indices, index=space.names).sort_values("ST", ascending=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensitivity of mean LOS to service time parameters")
+    parser.add_argument("method", choices=["morris", "sobol"])
+    parser.add_argument("--trajectories", type=int, default=20, help="Morris trajectories")
+    parser.add_argument("--levels", type=int, default=4, help="Morris grid levels")
+    parser.add_argument("--samples", type=int, default=256, help="Sobol base samples")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--sim-time", type=int, default=DEFAULT_CONFIG["sim_time"])
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--service-times", default=None,
+                        help="CSV table (activity, low, mode, high) of nominal service times")
+    parser.add_argument("--cache", default=CACHE_PATH)
+    parser.add_argument("--output", default=None, help="Write the indices to this CSV file")
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_CONFIG, sim_time=args.sim_time)
+    cache = ResultCache(args.cache)
+    space = ParameterSpace(load_service_times(args.service_times) if args.service_times else None)
+    if args.method == "morris":
+        report = run_morris(args.trajectories, args.levels, config, args.seed, args.processes, cache, space)
+    else:
+        report = run_sobol(args.samples, config, args.seed, args.processes, cache, space)
+
+    print(report.to_string())
+    if args.output:
+        report.to_csv(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import csv
+
+# Triangular (low, mode, high) service times in minutes for each activity
+# of the ER flow
+SERVICE_TIMES = {
+    "arrival_ctas": (1, 2, 3),
+    "resuscitation_transfer": (1, 2, 4),
+    "ctas_1_attend": (2, 4, 9),
+    "registration": (3, 4, 8),
+    "triage_screening": (4, 6, 8),
+    "triage_diagnostic": (4, 6, 8),
+    "triage_assessment": (4, 6, 8),
+    "ed_assessment": (4, 6, 8),
+    "ed_procedure": (4, 6, 10),
+    "x_ray": (10, 18, 30),
+    "urine_test": (5, 7, 12),
+    "ecg": (45, 55, 60),
+    "blood_tube_restock": (1, 2, 3),
+    "blood_test": (5, 7, 12),
+    "ct_approval": (1, 2, 3),
+    "ct_scan": (45, 55, 60),
+    "consultation_ctas_1": (10, 15, 30),
+    "consultation": (5, 10, 30),
+    "medication_wait": (1, 2, 3),
+    "medication": (1, 2, 3),
+    "inpatient_review": (1, 2, 3),
+    "ed_departure": (4, 7, 9),
+    "bed_release": (30, 50, 90),
+}
+
+
+def triangular_mean(low, mode, high):
+    return (low + mode + high) / 3
+
+
+def load_service_times(path):
+    """
+    Read a service time table from a CSV file with columns
+    activity, low, mode, high. Activities not in the file keep
+    their SERVICE_TIMES values.
+    """
+    service_times = dict(SERVICE_TIMES)
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            activity = row["activity"]
+            if activity not in SERVICE_TIMES:
+                raise KeyError(f"Unknown activity {activity} in {path}")
+            service_times[activity] = (float(row["low"]), float(row["mode"]), float(row["high"]))
+    return service_times
+
+
+def save_service_times(service_times, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["activity", "low", "mode", "high"])
+        for activity, (low, mode, high) in service_times.items():
+            writer.writerow([activity, low, mode, high])
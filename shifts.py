@@ -0,0 +1,127 @@
+import bisect
+import numbers
+import numpy as np
+import simpy
+
+DAYS_PER_WEEK = 7
+HOURS_PER_DAY = 24
+HOURS_PER_WEEK = DAYS_PER_WEEK * HOURS_PER_DAY
+
+# Simulation clock is in minutes (ERSim sim_time=43800 is one month)
+MINUTES_PER_HOUR = 60
+
+
+class ShiftRoster:
+    """
+    ShiftRoster defines the number of staff on duty for every
+    hour of the week (day-of-week x hour-of-day). Day 0 is the day
+    the simulation starts on and hour 0 is midnight.
+    """
+
+    def __init__(self, grid):
+        grid = np.asarray(grid, dtype=int)
+        if grid.shape != (DAYS_PER_WEEK, HOURS_PER_DAY):
+            raise ValueError(f"Roster grid must have shape "
+                             f"({DAYS_PER_WEEK}, {HOURS_PER_DAY}), got {grid.shape}")
+        if (grid < 0).any():
+            raise ValueError("Roster grid cannot have negative staff counts")
+        self.grid = grid
+
+    @classmethod
+    def constant(cls, count):
+        return cls(np.full((DAYS_PER_WEEK, HOURS_PER_DAY), count))
+
+    @classmethod
+    def from_shifts(cls, shifts):
+        """
+        Build a roster from (days, start_hour, end_hour, count) tuples.
+        A shift with end_hour <= start_hour runs past midnight into
+        the next day, e.g. (range(7), 19, 7, 4) is a night shift of
+        four staff every day of the week.
+        """
+        hours = np.zeros(HOURS_PER_WEEK, dtype=int)
+        for days, start_hour, end_hour, count in shifts:
+            if isinstance(days, numbers.Integral):
+                days = [days]
+            length = (end_hour - start_hour) % HOURS_PER_DAY or HOURS_PER_DAY
+            for day in days:
+                start = day * HOURS_PER_DAY + start_hour
+                index = np.arange(start, start + length) % HOURS_PER_WEEK
+                hours[index] += count
+        return cls(hours.reshape(DAYS_PER_WEEK, HOURS_PER_DAY))
+
+    @classmethod
+    def from_staff(cls, staff):
+        """
+        Build a roster from staff objects (e.g. Nurse) whose schedule_time
+        is a list of (day, start_hour, end_hour) shifts. The schedules are
+        aggregated once into the weekly grid, so the number of staff does
+        not add any simulation events.
+        """
+        return cls.from_shifts((day, start_hour, end_hour, 1)
+                               for member in staff
+                               for day, start_hour, end_hour in member.schedule_time)
+
+    def capacity_at(self, hour_of_week):
+        day, hour = divmod(int(hour_of_week) % HOURS_PER_WEEK, HOURS_PER_DAY)
+        return int(self.grid[day, hour])
+
+    def change_points(self):
+        """
+        Hours of the week at which the staff count changes, with the
+        new count. Consecutive hours with equal staffing are merged, so
+        only real shift boundaries are returned.
+        """
+        hours = self.grid.ravel()
+        changed = np.flatnonzero(hours != np.roll(hours, 1))
+        return [(int(hour), int(hours[hour])) for hour in changed]
+
+    def peak(self):
+        return int(self.grid.max())
+
+
+class ShiftResource(simpy.Resource):
+    """
+    ShiftResource: simpy Resource whose capacity follows a ShiftRoster.
+    A single process per resource wakes up at each shift boundary and
+    updates the capacity; staff leaving a shift finish the task they
+    are busy with before the reduced capacity takes effect.
+    """
+
+    def __init__(self, env, roster, start_hour=0, minutes_per_hour=MINUTES_PER_HOUR):
+        # simpy requires a positive capacity at creation; the roster
+        # capacity is applied straight after
+        super().__init__(env, capacity=1)
+        self.roster = roster
+        self.start_hour = start_hour
+        self.minutes_per_hour = minutes_per_hour
+        self._change_points = roster.change_points()
+        self._change_hours = [hour for hour, _ in self._change_points]
+        self._capacity = roster.capacity_at(start_hour + env.now / minutes_per_hour)
+
+    def set_capacity(self, capacity):
+        self._capacity = capacity
+        # Grant queued requests that fit under the new capacity
+        while self.put_queue and len(self.users) < self._capacity:
+            self._trigger_put(None)
+
+    def follow_roster(self):
+        if not self._change_points:
+            return
+
+        now_hour = self.start_hour + self._env.now / self.minutes_per_hour
+        week, hour_of_week = divmod(now_hour, HOURS_PER_WEEK)
+        index = bisect.bisect_right(self._change_hours, hour_of_week)
+
+        # Walk the change points in order; one event per shift boundary
+        while True:
+            if index == len(self._change_points):
+                week += 1
+                index = 0
+            change_hour, capacity = self._change_points[index]
+
+            change_time = ((week * HOURS_PER_WEEK + change_hour - self.start_hour)
+                           * self.minutes_per_hour)
+            yield self._env.timeout(max(change_time - self._env.now, 0))
+            self.set_capacity(capacity)
+            index += 1
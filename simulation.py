@@ -1,7 +1,23 @@
-import random
-import numpy as np
 import simpy
+from input_models import INPUT_MODELS_PATH, load_input_models
 from patients import Patient
+from service_times import SERVICE_TIMES
+from shifts import ShiftResource
+from streams import make_stream
+
+# Bump whenever model output changes (fingerprint.py verify fails), so
+# cached results of earlier versions are not reused
+MODEL_VERSION = 5
+
+# Probabilities of routing decisions that are not calibrated yet, so
+# they keep their constant outcome. Each decision still takes one draw
+# from the patient stream, so changing a probability keeps antithetic
+# runs paired.
+X_RAY_PROBABILITY = 0.0  # ED radiology is an X-ray rather than a CT scan
+TRIAGE_CONSULTATION_PROBABILITY = 0.0
+REFER_IMMEDIATELY_PROBABILITY = 0.0
+ADMIT_PROBABILITY = 0.0
+ED_CONSULTATION_PROBABILITY = 0.0
 
 
 class ERSim:
@@ -12,20 +28,53 @@ class ERSim:
 
     patient_count = 0
 
-    def __init__(self, num_doctors, num_nurses, num_admin_staff, num_consultants, num_beds, sim_time, seed):
+    def __init__(self, num_doctors, num_nurses, num_admin_staff, num_consultants, num_beds, sim_time, seed,
+                 rosters=None, service_times=None, arrival_rate=2.7, antithetic=False,
+                 province=None, source=None, input_models=INPUT_MODELS_PATH, refer_out_probability=0.0,
+                 verbose=True):
 
-        random.seed(seed)
+        # All sampling goes through uniform streams so that an
+        # antithetic run mirrors the plain run with the same seed
+        self.seed = seed
+        self.antithetic = antithetic
+        self.arrival_rng = make_stream(seed, "arrivals", antithetic)
         self.env = simpy.Environment()
         self.num_doctors = num_doctors
         self.num_nurses = num_nurses
         self.num_beds = num_beds
         self.sim_time = sim_time
 
+        # Triangular service time parameters; overrides replace
+        # single activities of the default table
+        self.service_times = dict(SERVICE_TIMES)
+        self.service_times.update(service_times or {})
+        self.service_rngs = {activity: make_stream(seed, activity, antithetic)
+                             for activity in self.service_times}
+        self.service_time_totals = {}
+        self.service_time_counts = {}
+
+        # Patients per minute; fitted NACRS rate when a province is given,
+        # from the source workbook when the file holds more than one
+        self.input_models = None
+        if province is not None:
+            self.input_models = load_input_models(input_models)
+            arrival_rate = self.input_models.arrival_rate(province, source)
+        self.arrival_rate = arrival_rate
+
+        # Share of screened patients sent to a local health center
+        # (CTAS 6) instead of registration; not calibrated yet, so by
+        # default every screened patient is registered
+        self.refer_out_probability = refer_out_probability
+
         self.patients = []
-        self.doctor = simpy.Resource(self.env, capacity=num_doctors)
-        self.nurse = simpy.Resource(self.env, capacity=num_nurses)
-        self.admin_staff = simpy.Resource(self.env, capacity=num_admin_staff)
-        self.consultant = simpy.Resource(self.env, capacity=num_consultants)
+
+        # Staff with a ShiftRoster follow it; others have fixed capacity.
+        # The num_* count of rostered staff is not used for capacity
+        self.rosters = rosters or {}
+        self.doctor = self.get_staff_resource("doctor", num_doctors)
+        self.nurse = self.get_staff_resource("nurse", num_nurses)
+        self.admin_staff = self.get_staff_resource("admin_staff", num_admin_staff)
+        self.consultant = self.get_staff_resource("consultant", num_consultants)
 
         self.bed = simpy.Resource(self.env, capacity=num_beds)
         self.ecg_machine = simpy.Resource(self.env, capacity=10)
@@ -46,18 +95,38 @@ class ERSim:
         self.blood_tubes = simpy.Container(self.env, capacity=25)
         self.patients_processed = 0
 
-    def run_simulation(self):
+        # Trace patient flow on stdout; off for batch runs
+        self.verbose = verbose
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
+    def get_staff_resource(self, name, capacity):
+        if name in self.rosters:
+            return ShiftResource(self.env, self.rosters[name])
+        return simpy.Resource(self.env, capacity=capacity)
+
+    def start_simulation(self):
+        # One roster process per shift resource, not per staff member
+        for staff in (self.doctor, self.nurse, self.admin_staff, self.consultant):
+            if isinstance(staff, ShiftResource):
+                self.env.process(staff.follow_roster())
+
         self.env.process(self.generate_patients())
+
+    def run_simulation(self):
+        self.start_simulation()
         self.env.run(until=self.sim_time)
-        print("Resource count: ", self.doctor.count, self.nurse.count,
-              self.admin_staff.count, self.consultant.count)
+        self.log("Resource count: ", self.doctor.count, self.nurse.count,
+                 self.admin_staff.count, self.consultant.count)
 
     def generate_patients(self):
         while True:
-            print("Patient produced")
+            self.log("Patient produced")
 
             # Constant inter-arrival times
-            self.inter_arrival_time = random.expovariate(2.7)
+            self.inter_arrival_time = self.arrival_rng.expovariate(self.arrival_rate)
 
             # Inter-arrival times according to CTAS level.
             # Check probability of CTAS I-III or IV-V
@@ -69,27 +138,46 @@ class ERSim:
             #     self.inter_arrival_time = random.expovariate(1.0)
 
             ERSim.patient_count += 1
-            patient = Patient(self.env.now)
+            patient = Patient(self.env.now, rng=self.get_patient_stream())
             self.patients.append(patient)
-            self.env.process(self.patient_flow(patient))
+            if not self.divert(patient):
+                self.env.process(self.patient_flow(patient))
             yield self.env.timeout(self.inter_arrival_time)
 
-    def get_screening_results(self):
-        return random.choices([0, 1], weights=[9, 1])
+    def divert(self, patient):
+        # A single ED never diverts arriving patients
+        return False
+
+    def get_service_time(self, activity):
+        low, mode, high = self.service_times[activity]
+        time = self.service_rngs[activity].triangular(low, high, mode)
+
+        # Sampled totals, used as control variates
+        self.service_time_totals[activity] = self.service_time_totals.get(activity, 0) + time
+        self.service_time_counts[activity] = self.service_time_counts.get(activity, 0) + 1
+        return time
+
+    def get_patient_stream(self):
+        # Routing decisions of the k-th patient use the k-th patient stream
+        return make_stream(self.seed, f"patient{len(self.patients)}", self.antithetic)
+
+    def get_screening_results(self, patient):
+        # True when the patient needs the ED; one draw either way
+        return patient.rng.random() >= self.refer_out_probability
 
     def enter_registration_counter(self):
         with self.admin_staff.request() as admin_staff_request:
             yield admin_staff_request
 
-            registration_time = np.random.triangular(3, 4, 8)
+            registration_time = self.get_service_time("registration")
             yield self.env.timeout(registration_time)
 
             self.admin_staff.release(admin_staff_request)
 
     def enter_triage_waiting_room(self, patient):
-        print(f"Patient {patient.id} enters triage waiting room")
+        self.log(f"Patient {patient.id} enters triage waiting room")
         self.triage_waiting_room.append(patient.id)
-        print(f"Triage waiting room: {self.triage_waiting_room}")
+        self.log(f"Triage waiting room: {self.triage_waiting_room}")
 
         # Max waiting room length
         self.triage_waiting_room_len = max(self.triage_waiting_room_len, len(self.triage_waiting_room))
@@ -97,10 +185,10 @@ class ERSim:
 
     def get_triage_time(self, scale):
         if scale == "Screening":
-            time = np.random.triangular(4, 6, 8)
+            time = self.get_service_time("triage_screening")
             yield self.env.timeout(time)
         elif scale == "Diagnostic":
-            time = np.random.triangular(4, 6, 8)
+            time = self.get_service_time("triage_diagnostic")
             yield self.env.timeout(time)
 
     def get_x_ray(self, patient, staff_request=1):
@@ -118,7 +206,7 @@ class ERSim:
                         yield x_ray_machine
 
                         # Time for x_ray to complete
-                        x_ray_time = np.random.triangular(10, 18, 30)
+                        x_ray_time = self.get_service_time("x_ray")
                         yield self.env.timeout(x_ray_time)
 
                         self.x_ray_machine.release(x_ray_machine)
@@ -135,7 +223,7 @@ class ERSim:
                 yield x_ray_machine
 
                 # Time for x_ray to complete
-                x_ray_time = np.random.triangular(10, 18, 30)
+                x_ray_time = self.get_service_time("x_ray")
                 yield self.env.timeout(x_ray_time)
 
                 self.x_ray_machine.release(x_ray_machine)
@@ -146,11 +234,11 @@ class ERSim:
                 self.x_ray_machine.release(x_ray_machine)
 
     def get_urine_test(self, patient):
-        print(f"Patient{patient.id} arrives for urine test")
+        self.log(f"Patient{patient.id} arrives for urine test")
         with self.nurse.request() as nurse_request:
             yield nurse_request
 
-            urine_test_time = np.random.triangular(5, 7, 12)
+            urine_test_time = self.get_service_time("urine_test")
             yield self.env.timeout(urine_test_time)
 
             # Assign CTAS level
@@ -159,11 +247,11 @@ class ERSim:
             self.nurse.release(nurse_request)
 
     def get_ecg_test(self, patient):
-        print(f"Patient{patient.id} arrives for ECG test")
+        self.log(f"Patient{patient.id} arrives for ECG test")
         with self.admin_staff.request() as admin_staff_request:
             yield admin_staff_request
 
-            ecg_time = np.random.triangular(45, 55, 60)
+            ecg_time = self.get_service_time("ecg")
             yield self.env.timeout(ecg_time)
 
             with self.doctor.request() as doctor_request:
@@ -183,25 +271,25 @@ class ERSim:
         with self.nurse.request() as nurse_request:
             yield nurse_request
 
-            print(f"Patient{patient.id} arrives for blood test")
-            print("Looking for blood tubes")
+            self.log(f"Patient{patient.id} arrives for blood test")
+            self.log("Looking for blood tubes")
             if self.blood_tubes.level < 1:
-                print(f"Blood tubes not available not available")
+                self.log(f"Blood tubes not available not available")
 
                 # Time to get the blood tubes
-                time = np.random.triangular(1, 2, 3)
+                time = self.get_service_time("blood_tube_restock")
                 yield self.env.timeout(time)
                 self.medication.put(1)
-                print(f"Blood tubes now available")
+                self.log(f"Blood tubes now available")
 
                 # Take blood sample
                 yield self.medication.get(1)
             else:
-                print(f"Medication available")
+                self.log(f"Medication available")
                 yield self.medication.get(1)
 
             # Blood sample taken.
-            blood_test_time = np.random.triangular(5, 7, 12)
+            blood_test_time = self.get_service_time("blood_test")
             yield self.env.timeout(blood_test_time)
 
             self.nurse.release(nurse_request)
@@ -210,7 +298,7 @@ class ERSim:
         with self.doctor.request() as doctor_request:
             yield doctor_request
 
-            ct_scan_time = np.random.triangular(45, 55, 60)
+            ct_scan_time = self.get_service_time("ct_scan")
             yield self.env.timeout(ct_scan_time)
 
             self.doctor.release(doctor_request)
@@ -218,7 +306,7 @@ class ERSim:
     def get_radiological_test(self, patient):
         # Doctor fills request form
         # Check if CT or X-Ray required.
-        choice = np.random.randint(0, 1)
+        choice = 1 if patient.rng.random() < X_RAY_PROBABILITY else 0
 
         if choice == 1:
             patient.tests.append("ED X-Ray")
@@ -230,7 +318,7 @@ class ERSim:
                 yield admin_staff_request
 
                 # Admin/Radiologist approves scan request
-                time = np.random.triangular(1, 2, 3)
+                time = self.get_service_time("ct_approval")
                 yield self.env.timeout(time)
 
                 # Get CT
@@ -240,47 +328,47 @@ class ERSim:
 
     def get_diagnostic_tests(self, patient, department):
         if department == "Triage":
-            print(f"Patient{patient.id} getting Triage tests")
-            triage_diag_tests = random.choice([0, 1, 2, 3, 4, 5, 6, 7])
+            self.log(f"Patient{patient.id} getting Triage tests")
+            triage_diag_tests = patient.rng.choice([0, 1, 2, 3, 4, 5, 6, 7])
             triage_diag_tests = f"{triage_diag_tests:2b}"
-            print(triage_diag_tests)
+            self.log(triage_diag_tests)
 
             for index, val in enumerate(triage_diag_tests):
                 if val == "1":
                     if index == 0:
                         patient.tests.append("Triage ECG")
-                        print(f"Send patient{patient.id} for ECG test")
+                        self.log(f"Send patient{patient.id} for ECG test")
                         yield self.env.process(self.get_ecg_test(patient))
-                        print("ECG complete. Send back to get CTAS results")
+                        self.log("ECG complete. Send back to get CTAS results")
                     elif index == 1:
                         patient.tests.append("Triage Urine")
-                        print(f"Send patient{patient.id} for urine test")
+                        self.log(f"Send patient{patient.id} for urine test")
                         yield self.env.process(self.get_urine_test(patient))
                     elif index == 2:
                         patient.tests.append("Triage X-Ray")
-                        print(f"Send patient{patient.id} for XRay test")
+                        self.log(f"Send patient{patient.id} for XRay test")
                         yield self.env.process(self.get_x_ray(patient, staff_request=1))
 
         elif department == "ED":
-            print(f"Patient{patient.id} getting ED tests")
+            self.log(f"Patient{patient.id} getting ED tests")
             # Doctor always needed for ED diagnostic tests!
-            ed_diag_tests = random.choice([0, 1, 2, 3])
+            ed_diag_tests = patient.rng.choice([0, 1, 2, 3])
             ed_diag_tests = f"{ed_diag_tests:2b}"
-            print(ed_diag_tests)
+            self.log(ed_diag_tests)
 
             for index, val in enumerate(ed_diag_tests):
                 if val == "1":
                     if index == 0:
                         patient.tests.append("ED Blood Test")
-                        print(f"Send patient{patient.id} for blood test")
+                        self.log(f"Send patient{patient.id} for blood test")
                         yield self.env.process(self.get_blood_test(patient))
                     elif index == 1:
-                        print(f"Send patient{patient.id} for radiological test")
+                        self.log(f"Send patient{patient.id} for radiological test")
                         yield self.env.process(self.get_radiological_test(patient))
 
     def get_arrival_ctas(self, patient):
-        patient.ctas_level = random.choice([0, 1, 2, 3, 4, 5])
-        time = np.random.triangular(1, 2, 3)
+        patient.ctas_level = patient.rng.choice([0, 1, 2, 3, 4, 5])
+        time = self.get_service_time("arrival_ctas")
         yield self.env.timeout(time)
 
     def get_consultation(self, patient):
@@ -290,11 +378,11 @@ class ERSim:
             if patient.ctas_level == 1:
                 # Consultation for CTAS I patients
                 # Time for consultation
-                time = np.random.triangular(10, 15, 30)
+                time = self.get_service_time("consultation_ctas_1")
                 yield self.env.timeout(time)
             else:
                 # Time for consultation
-                time = np.random.triangular(5, 10, 30)
+                time = self.get_service_time("consultation")
                 yield self.env.timeout(time)
 
                 # Re-triage to higher CTAS
@@ -303,7 +391,7 @@ class ERSim:
             self.consultant.release(consultant_request)
 
     def triage_process(self, patient):
-        print(f"Patient{patient.id} sent to triage waiting room")
+        self.log(f"Patient{patient.id} sent to triage waiting room")
         time_enter_waiting_room = self.env.now
         yield self.env.process(self.enter_triage_waiting_room(patient))
 
@@ -311,7 +399,7 @@ class ERSim:
             yield nurse_request
 
             # Pop patient out from triage waiting room
-            print(f"Removing patient {patient.id} from triage waiting room")
+            self.log(f"Removing patient {patient.id} from triage waiting room")
             self.triage_waiting_room.remove(patient.id)
 
             time_exit_waiting_room = self.env.now
@@ -320,20 +408,20 @@ class ERSim:
 
             # Wait for triage service time
             yield self.env.process(self.get_triage_time("Screening"))
-            print(f"Patient{patient.id} triage screening complete")
+            self.log(f"Patient{patient.id} triage screening complete")
 
             self.nurse.release(nurse_request)
 
         # Requirement to be in ED or not
-        ed_requirement = self.get_screening_results()
+        ed_requirement = self.get_screening_results(patient)
 
         if ed_requirement:
-            print(f"Patient{patient.id} sent to registration counter")
+            self.log(f"Patient{patient.id} sent to registration counter")
             # send to registration desk
             yield self.env.process(self.enter_registration_counter())
 
             # Re-enters the triage process - Diagnostic tests
-            print(f"Patient{patient.id} in triage waiting room")
+            self.log(f"Patient{patient.id} in triage waiting room")
             yield self.env.process(self.enter_triage_waiting_room(patient))
             time_enter_waiting_room = self.env.now
 
@@ -342,9 +430,9 @@ class ERSim:
                 yield nurse_request_2
 
                 # Pop patient out from triage waiting room
-                print(f"Removing patient {patient.id} from triage waiting room")
+                self.log(f"Removing patient {patient.id} from triage waiting room")
                 self.triage_waiting_room.remove(patient.id)
-                print(f"Triage waiting room: {self.triage_waiting_room}")
+                self.log(f"Triage waiting room: {self.triage_waiting_room}")
 
                 time_exit_waiting_room = self.env.now
                 time = time_exit_waiting_room - time_enter_waiting_room
@@ -358,42 +446,45 @@ class ERSim:
 
             # Process 1: get diagnostic tests done
             # Subprocess 1
-            print("Enter subprocess 1: Get diagnostic results", self.env.now)
+            self.log("Enter subprocess 1: Get diagnostic results", self.env.now)
             yield self.env.process(self.get_diagnostic_tests(patient, "Triage"))
-            print(f"Patient{patient.id} back from diagnostics.", self.env.now)
+            self.log(f"Patient{patient.id} back from diagnostics.", self.env.now)
 
             # Process 2: get CTAS level.
             # CTAS level can also be given while diagnostics are getting done
             if patient.ctas_level is None:
                 patient.ctas_level = patient.get_ctas_level()
 
-            print(f"Patient{patient.id} triage diagnostic complete")
-            print(f"Patient{patient.id} CTAS level {patient.ctas_level}")
+            self.log(f"Patient{patient.id} triage diagnostic complete")
+            self.log(f"Patient{patient.id} CTAS level {patient.ctas_level}")
 
             if patient.ctas_level == 5:
                 # Send to triage doctor
-                print(f"Patient{patient.id} CTAS V. Sent to triage doctor")
+                self.log(f"Patient{patient.id} CTAS V. Sent to triage doctor")
                 self.env.process(self.triage_treatment(patient))
             else:
                 # Send to ED and start ED process
-                print(f"Patient{patient.id} sent to ED")
+                self.log(f"Patient{patient.id} sent to ED")
                 self.env.process(self.ed_process(patient))
 
         else:
             # Send patient to local health center
-            print("Send patient to local health center")
+            self.log("Send patient to local health center")
             patient.ctas_level = 6
+            self.refer_out(patient)
 
-            patient.leave_time = self.env.now
-            self.patients_processed += 1
+    def refer_out(self, patient):
+        # Patient leaves the ED for the local health center
+        patient.leave_time = self.env.now
+        self.patients_processed += 1
 
     def triage_treatment(self, patient):
         with self.doctor.request() as doctor_request:
             yield doctor_request
 
-            print(f"Doctor assigned to Patient{patient.id} in triage treatment")
+            self.log(f"Doctor assigned to Patient{patient.id} in triage treatment")
 
-            assessment_time = np.random.triangular(4, 6, 8)
+            assessment_time = self.get_service_time("triage_assessment")
             yield self.env.timeout(assessment_time)
 
             # Medication time
@@ -407,9 +498,9 @@ class ERSim:
 
             # Review/Consultation step
             # Patient can be re-triaged to higher CTAS level
-            consultation = np.random.randint(0, 1)
+            consultation = patient.rng.random() < TRIAGE_CONSULTATION_PROBABILITY
 
-            if consultation == 1:
+            if consultation:
                 yield self.env.process(self.get_consultation(patient))
 
                 # If re-triaged send to ED
@@ -426,51 +517,51 @@ class ERSim:
             self.doctor.release(doctor_request)
 
     def enter_medication_waiting_room(self, patient):
-        print(f"Patient{patient.id} enters medication waiting room")
+        self.log(f"Patient{patient.id} enters medication waiting room")
         self.medication_waiting_room.append(patient.id)
-        print(f"Medication waiting room: {self.medication_waiting_room}")
+        self.log(f"Medication waiting room: {self.medication_waiting_room}")
 
         # Max waiting room len
         self.medication_waiting_room_len = max(self.medication_waiting_room_len, len(self.medication_waiting_room))
 
-        medication_waiting_time = np.random.triangular(1, 2, 3)
+        medication_waiting_time = self.get_service_time("medication_wait")
         patient.medication_waiting_time += medication_waiting_time
 
         return medication_waiting_time
 
     def give_medication(self, patient):
-        print("Looking for medication")
+        self.log("Looking for medication")
         if self.medication.level < 1:
-            print(f"Medication not available")
+            self.log(f"Medication not available")
             medication_waiting_time = self.enter_medication_waiting_room(patient)
             yield self.env.timeout(medication_waiting_time)
 
-            print(f"Medication now available")
+            self.log(f"Medication now available")
             self.medication.put(1)
 
             # Pop patient from ED waiting room list
             self.medication_waiting_room.remove(patient.id)
-            print(f"Medication waiting room: {self.medication_waiting_room}")
+            self.log(f"Medication waiting room: {self.medication_waiting_room}")
 
             yield self.medication.get(1)
         else:
-            print(f"Medication available")
+            self.log(f"Medication available")
             yield self.medication.get(1)
 
-        medication_time = np.random.triangular(1, 2, 3)
+        medication_time = self.get_service_time("medication")
         yield self.env.timeout(medication_time)
 
     def enter_ed_waiting_room(self, patient):
-        print(f"Patient{patient.id} enters ED waiting room")
+        self.log(f"Patient{patient.id} enters ED waiting room")
         self.ed_waiting_room.append(patient.id)
-        print(f"ED waiting room: {self.ed_waiting_room}")
+        self.log(f"ED waiting room: {self.ed_waiting_room}")
 
         # Max waiting room len
         self.ed_waiting_room_len = max(self.ed_waiting_room_len, len(self.ed_waiting_room))
         yield self.env.timeout(0)
 
     def ed_process(self, patient):
-        print(f"Patient{patient.id} arrives in ED")
+        self.log(f"Patient{patient.id} arrives in ED")
         yield self.env.process(self.enter_ed_waiting_room(patient))
         time_enter_waiting_room = self.env.now
 
@@ -479,36 +570,36 @@ class ERSim:
 
             # Pop patient from ED waiting room list
             self.ed_waiting_room.remove(patient.id)
-            print(f"ED waiting room: {self.ed_waiting_room}")
+            self.log(f"ED waiting room: {self.ed_waiting_room}")
 
             time_exit_waiting_room = self.env.now
             time = time_exit_waiting_room - time_enter_waiting_room
             patient.ed_waiting_time += time
 
-            print(f"Doctor assigned to Patient{patient.id} in ED treatment")
-            print(f"Performing assessment on patient{patient.id} in ED")
-            assessment_time = np.random.triangular(4, 6, 8)
+            self.log(f"Doctor assigned to Patient{patient.id} in ED treatment")
+            self.log(f"Performing assessment on patient{patient.id} in ED")
+            assessment_time = self.get_service_time("ed_assessment")
             yield self.env.timeout(assessment_time)
 
             # Check diagnostics required
             # Subprocess 2
-            diagnostic_required = random.randint(0, 1)
+            diagnostic_required = patient.rng.randint(0, 1)
             if diagnostic_required == 1:
                 self.doctor.release(doctor_request)
                 yield self.env.process(self.get_diagnostic_tests(patient, "ED"))
             else:
                 # else perform procedure on patient and give medication
-                procedure_time = np.random.triangular(4, 6, 10)
+                procedure_time = self.get_service_time("ed_procedure")
                 yield self.env.timeout(procedure_time)
                 self.doctor.release(doctor_request)
 
         # give medication
         if self.nurse.count == 0:
-            print(f"Nurse count = {self.nurse.count}")
-            print(f"No nurse available to give medication")
+            self.log(f"Nurse count = {self.nurse.count}")
+            self.log(f"No nurse available to give medication")
 
             # Doctor gives the medication
-            print("Doctor gives medication")
+            self.log("Doctor gives medication")
             with self.doctor.request() as doctor_request:
                 yield doctor_request
 
@@ -516,7 +607,7 @@ class ERSim:
                 self.doctor.release(doctor_request)
 
         else:
-            print("Calling available nurse")
+            self.log("Calling available nurse")
             # Call nurse to give medication
             with self.nurse.request() as nurse_request:
                 yield nurse_request
@@ -528,18 +619,18 @@ class ERSim:
             yield doctor_request
 
             # Refer patient to ED
-            refer_immediately = np.random.randint(0, 1)
+            refer_immediately = patient.rng.random() < REFER_IMMEDIATELY_PROBABILITY
 
             if refer_immediately:
-                print(f"Patient{patient.id} referred to inpatient treatment"
-                      f"immediately.")
+                self.log(f"Patient{patient.id} referred to inpatient treatment"
+                         f"immediately.")
                 self.doctor.release(doctor_request)
 
                 # Start inpatient process/treatment
                 self.env.process(self.inpatient_process(patient))
             else:
                 # Wait for results
-                # print("Wait for results")
+                # self.log("Wait for results")
 
                 # Perform further diagnosis/investigation
                 # Subprocess 2, required again!
@@ -552,7 +643,7 @@ class ERSim:
                 #   yield self.env.process(self.get_consultation(patient))
                 self.doctor.release(doctor_request)
 
-        disposition_decision = random.randint(0, 1)
+        disposition_decision = patient.rng.randint(0, 1)
         if disposition_decision == 1:
             # Refer further to inpatient department
             self.env.process(self.inpatient_process(patient))
@@ -561,9 +652,9 @@ class ERSim:
             self.patients_processed += 1
 
     def enter_inpatient_waiting_room(self, patient):
-        print(f"Patient{patient.id} enters inpatient waiting room")
+        self.log(f"Patient{patient.id} enters inpatient waiting room")
         self.inpatient_waiting_room.append(patient.id)
-        print(f"Inpatient waiting room: {self.inpatient_waiting_room}")
+        self.log(f"Inpatient waiting room: {self.inpatient_waiting_room}")
 
         # Max waiting room len
         self.inpatient_waiting_room_len = max(self.inpatient_waiting_room_len, len(self.inpatient_waiting_room))
@@ -583,7 +674,7 @@ class ERSim:
             patient.inpatient_waiting_time += time
 
             # Check patient and decide to admit
-            admit = np.random.randint(0, 1)
+            admit = patient.rng.random() < ADMIT_PROBABILITY
 
             # release doctor
             self.doctor.release(doctor_request)
@@ -605,7 +696,7 @@ class ERSim:
                 time = time_exit_waiting_room - time_enter_waiting_room
                 patient.ed_waiting_time += time
 
-                review_time = np.random.triangular(1, 2, 3)
+                review_time = self.get_service_time("inpatient_review")
                 yield self.env.timeout(review_time)
 
                 patient.leave_time = self.env.now
@@ -626,7 +717,7 @@ class ERSim:
                 yield bed_request
 
                 # Admin staff helps transfer out of ED
-                ed_depart_time = np.random.triangular(4, 7, 9)
+                ed_depart_time = self.get_service_time("ed_departure")
                 yield self.env.timeout(ed_depart_time)
 
                 patient.leave_time = self.env.now
@@ -639,22 +730,22 @@ class ERSim:
                 self.admin_staff.release(admin_staff_request)
 
     def release_beds(self):
-        yield self.env.timeout(np.random.triangular(30, 50, 90))
+        yield self.env.timeout(self.get_service_time("bed_release"))
 
     def ctas_1_process(self, patient):
         # If CTAS-I take to resuscitation room then send for tests.
         # Else directly attend and send for tests.
         if patient.ctas_level == 1:
             # Send to resuscitation room
-            transfer_time = np.random.triangular(1, 2, 4)
+            transfer_time = self.get_service_time("resuscitation_transfer")
             yield self.env.timeout(transfer_time)
 
         # Attend to the patient
-        time = np.random.triangular(2, 4, 9)
+        time = self.get_service_time("ctas_1_attend")
         yield self.env.timeout(time)
 
     def patient_flow(self, patient):
-        print(f"Patient{patient.id} enters the hospital")
+        self.log(f"Patient{patient.id} enters the hospital")
         with self.doctor.request() as doctor_request:
             yield doctor_request
 
@@ -670,7 +761,7 @@ class ERSim:
 
                 if patient.ctas_level == 1:
                     # CTAS 1 - Send patient the other way
-                    print(f"Patient{patient.id} CTAS I")
+                    self.log(f"Patient{patient.id} CTAS I")
                     yield self.env.process(self.ctas_1_process(patient))
 
                     # Send for ED diagnostic tests
@@ -679,14 +770,14 @@ class ERSim:
                     # Review diagnostic results
                     # If further tests required send to subprocess 2
                     # Then check if consultation needed
-                    further_tests = random.choices([0, 1], weights=[9, 1])
+                    further_tests = patient.rng.choices([0, 1], weights=[9, 1])
 
                     if further_tests == 1:
                         yield self.env.process(self.get_diagnostic_tests(patient, "ED"))
 
                     # Check if external consultation needed
                     # Else send to inpatient doctor.
-                    consultation = np.random.randint(0, 1)
+                    consultation = patient.rng.random() < ED_CONSULTATION_PROBABILITY
 
                     if consultation:
                         yield self.env.process(self.get_consultation(patient))
@@ -698,8 +789,8 @@ class ERSim:
                     self.env.process(self.inpatient_process(patient))
 
                 elif patient.ctas_level > 1:
-                    print(f"Patient{patient.id} not in CTAS I")
-                    print("Entering triage process")
+                    self.log(f"Patient{patient.id} not in CTAS I")
+                    self.log("Entering triage process")
                     # Release nurse, doctor and start triage process
                     self.nurse.release(nurse_request)
                     self.doctor.release(doctor_request)
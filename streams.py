@@ -0,0 +1,44 @@
+import random
+
+
+class UniformRandom(random.Random):
+    """
+    UniformRandom is random.Random with integers drawn by inverse
+    transform, int(u * n), of a single uniform u. The stock _randbelow
+    uses getrandbits, or floor(u * 2**53) % n, which neither takes
+    exactly one uniform per draw nor moves monotonically with u.
+    """
+
+    def _randbelow(self, n):
+        return int(self.random() * n)
+
+
+class AntitheticRandom(UniformRandom):
+    """
+    AntitheticRandom returns 1 - u for every uniform u of UniformRandom
+    with the same seed. randint, choice, choices, expovariate and
+    triangular all take one uniform per draw and are monotone in it, so
+    every draw of a run on this stream is the mirrored draw of the run
+    on the plain stream, as long as both runs make the same draws.
+    """
+
+    # Keep the inverse transform; random.Random would otherwise switch
+    # subclasses that override random() to _randbelow_without_getrandbits
+    _randbelow = UniformRandom._randbelow
+
+    def random(self):
+        u = super().random()
+        # 1 - u must stay in [0, 1) like random()
+        return 1.0 - u if u else 0.0
+
+
+def make_stream(seed, name=None, antithetic=False):
+    """
+    Uniform stream for seed, or an independent substream of it for
+    name. Separate substreams keep draws of the same purpose aligned
+    between runs (the k-th arrival uses the k-th arrival draw), which
+    antithetic and common random number runs depend on.
+    """
+    if name is not None:
+        seed = f"{seed}:{name}"
+    return AntitheticRandom(seed) if antithetic else UniformRandom(seed)
@@ -0,0 +1,144 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from scipy import stats
+from experiment import BASE_CONFIG, DEFAULT_SEED, mean_length_of_stay, run_ersim
+from service_times import triangular_mean
+
+# One week of the __main__ configuration in simulation.py
+DEFAULT_CONFIG = dict(BASE_CONFIG, sim_time=10080)
+
+CONTROLS = ("arrivals", "service_time_deviation")
+
+
+def control_values(sim):
+    """
+    Control variates of a finished run with known expectation zero:
+    the observed number of arrivals minus the expected count for the
+    arrival rate (the first patient arrives at time 0), and the mean
+    deviation of all sampled service times from their triangular means.
+    """
+    expected_arrivals = 1 + sim.arrival_rate * sim.sim_time
+
+    deviation = 0.0
+    draws = 0
+    for activity, total in sim.service_time_totals.items():
+        count = sim.service_time_counts[activity]
+        deviation += total - count * triangular_mean(*sim.service_times[activity])
+        draws += count
+
+    return {
+        "arrivals": len(sim.patients) - expected_arrivals,
+        "service_time_deviation": deviation / draws if draws else 0.0,
+    }
+
+
+def run_replication(args):
+    config, seed, antithetic = args
+    sim = run_ersim(config, seed, antithetic=antithetic)
+    return {"seed": seed, "antithetic": antithetic, "mean_los": mean_length_of_stay(sim), **control_values(sim)}
+
+
+def run_replications(num_replications, config=None, seed=DEFAULT_SEED, antithetic=False, processes=None):
+    """
+    Run num_replications independent replications with seeds seed,
+    seed + 1, ... With antithetic=True every seed is also run on the
+    mirrored uniform stream, giving num_replications antithetic pairs.
+    """
+    config = dict(DEFAULT_CONFIG if config is None else config)
+    jobs = [(config, seed + replication, False) for replication in range(num_replications)]
+    if antithetic:
+        jobs += [(config, seed + replication, True) for replication in range(num_replications)]
+
+    if processes == 1:
+        rows = list(map(run_replication, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            rows = list(executor.map(run_replication, jobs))
+    return pd.DataFrame(rows)
+
+
+def plain_estimate(outputs, confidence=0.95):
+    outputs = np.asarray(outputs, dtype=float)
+    n = len(outputs)
+    variance = outputs.var(ddof=1) / n
+    return _estimate(outputs.mean(), variance, n - 1, confidence)
+
+
+def control_variate_estimate(outputs, controls, confidence=0.95):
+    """
+    Control-variate estimate of the mean of outputs, where controls is
+    an (n, q) array of quantities with known expectation zero. The
+    coefficients are fitted by least squares over the replications.
+    """
+    outputs = np.asarray(outputs, dtype=float)
+    controls = np.asarray(controls, dtype=float).reshape(len(outputs), -1)
+    n, q = controls.shape
+    if n <= q + 1:
+        raise ValueError(f"Need more than {q + 1} replications for {q} control variates")
+
+    centered = controls - controls.mean(axis=0)
+    beta, *_ = np.linalg.lstsq(centered, outputs - outputs.mean(), rcond=None)
+
+    adjusted = outputs - controls @ beta
+    residuals = outputs - outputs.mean() - centered @ beta
+    variance = residuals @ residuals / (n - q - 1) / n
+    estimate = _estimate(adjusted.mean(), variance, n - q - 1, confidence)
+    estimate["beta"] = beta
+    return estimate
+
+
+def _estimate(mean, variance, dof, confidence):
+    half_width = stats.t.ppf(0.5 + confidence / 2, dof) * np.sqrt(variance)
+    return {"mean": mean, "variance": variance, "half_width": half_width}
+
+
+def variance_reduction_report(replications, confidence=0.95):
+    """
+    Compare the estimators available for a set of replications. The
+    variance reduction column is the variance of a plain mean over the
+    same number of simulation runs divided by the variance of each
+    estimator; it is also the factor by which the number of
+    replications can be cut for the same confidence interval width.
+    """
+    plain = replications[~replications["antithetic"]]
+    estimates = {
+        "independent": plain_estimate(plain["mean_los"], confidence),
+        "control variates": control_variate_estimate(plain["mean_los"], plain[list(CONTROLS)], confidence),
+    }
+    runs = {"independent": len(plain), "control variates": len(plain)}
+
+    if replications["antithetic"].any():
+        mirrored = replications[replications["antithetic"]]
+        columns = ["mean_los", *CONTROLS]
+        pairs = (plain.set_index("seed")[columns] + mirrored.set_index("seed")[columns]) / 2
+
+        estimates["antithetic"] = plain_estimate(pairs["mean_los"], confidence)
+        estimates["antithetic + control variates"] = control_variate_estimate(
+            pairs["mean_los"], pairs[list(CONTROLS)], confidence)
+        runs["antithetic"] = runs["antithetic + control variates"] = len(replications)
+
+    report = pd.DataFrame(estimates).T[["mean", "variance", "half_width"]].astype(float)
+    report["runs"] = pd.Series(runs)
+    report["variance_reduction"] = plain["mean_los"].var(ddof=1) / report["runs"] / report["variance"]
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Variance-reduced estimates of mean LOS")
+    parser.add_argument("--replications", type=int, default=20)
+    parser.add_argument("--antithetic", action="store_true", help="Run antithetic pairs")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--sim-time", type=int, default=DEFAULT_CONFIG["sim_time"])
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    config = dict(DEFAULT_CONFIG, sim_time=args.sim_time)
+    replications = run_replications(args.replications, config, args.seed, args.antithetic, args.processes)
+    print(variance_reduction_report(replications, args.confidence).to_string())
+
+
+if __name__ == "__main__":
+    main()